@@ -1,139 +1,1283 @@
 """Blackjack simulator
 """
 import itertools
-from collections import defaultdict
+import json
+import concurrent.futures
+import functools
+from array import array
+from functools import partial
+import mmap
+import os
+import queue
 import random
+import sys
+import threading
 import time
 import statistics
 
+try:
+    import numpy as np
+except ImportError:  # only needed by the array based engines
+    np = None
 
-def simulate(cards, bets, players, results):
-    hands = [[] for _ in range(players)]
-    dealer = []
+try:
+    from opentelemetry import metrics as otel_metrics, trace as otel_trace
+except ImportError:  # only needed by Telemetry
+    otel_metrics = otel_trace = None
 
-    def draw():
-        card = cards.pop(0)
-        cards.append(card)  # TODO: change to collect cards at end by adding players cards then dealer cards
+
+class Shoe:
+    """Shuffled cards dealt by moving a cursor along a list.
+
+    A cut card is placed penetration of the way into the shoe. Cards dealt
+    in finished rounds are the discards; once the cut card has come out the
+    discards are collected and the whole shoe is reshuffled at the end of
+    that round. Given a ShoeSource, reshuffling takes its next shoe instead.
+    """
+
+    def __init__(self, decks=8, penetration=0.75, rng=random, source=None):
+        self.cards = get_cards(decks)
+        self.cut = int(len(self.cards) * penetration)
+        self.rng = rng
+        self.source = source
+        self.pos = 0
+        self.round_start = 0
+        self.shuffle()
+
+    def shuffle(self):
+        if self.source is None:
+            self.rng.shuffle(self.cards)
+        else:
+            self.cards = self.source.next_shoe()
+        self.pos = 0
+        self.round_start = 0
+
+    def draw(self):
+        if self.pos == len(self.cards):
+            self._recycle()
+        card = self.cards[self.pos]
+        self.pos += 1
         return card
 
-    def sum_a11(hand):
-        total = sum(hand)
-        if 1 in hand and total + 10 <= 21:
-            return total + 10
-        return total
+    def peek(self, k=0):
+        """The card k places after the next one to be drawn."""
+        return self.cards[self.pos + k]
+
+    def end_round(self):
+        if self.pos >= self.cut:
+            self.shuffle()
+        else:
+            self.round_start = self.pos
+
+    def _recycle(self):
+        # Ran out mid round, so shuffle the discards back in behind the
+        # cards that are still on the table.
+        in_play = self.cards[self.round_start:]
+        discards = self.cards[:self.round_start]
+        if not discards:
+            raise IndexError("shoe is too small for a single round")
+        self.rng.shuffle(discards)
+        self.cards = in_play + discards
+        self.pos = len(in_play)
+        self.round_start = 0
+
+
+class ShoeSource:
+    """Shuffled shoes generated in bulk as rows of a 2-D array.
+
+    Shuffling a whole block of shoes at once with numpy is much cheaper
+    than random.shuffle on every shoe. With background, blocks are made on
+    a thread ahead of time, up to prefetch blocks waiting.
+    """
+
+    def __init__(self, decks=8, seed=None, block=1024, background=False, prefetch=2):
+        self.rng = np.random.default_rng(seed)
+        self.cards = np.array(get_cards(decks), dtype=np.int8)
+        self.block = block
+        self._rows = iter(())
+        self._blocks = None
+        if background:
+            self._blocks = queue.Queue(maxsize=prefetch)
+            self._stop = threading.Event()
+            threading.Thread(target=self._produce, daemon=True).start()
+
+    def make_block(self):
+        return self.rng.permuted(np.broadcast_to(self.cards, (self.block, len(self.cards))), axis=1)
+
+    def _produce(self):
+        while not self._stop.is_set():
+            block = self.make_block()
+            while not self._stop.is_set():
+                try:
+                    self._blocks.put(block, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def next_shoe(self):
+        for row in self._rows:
+            return row.tolist()
+        self._rows = iter(self.make_block() if self._blocks is None else self._blocks.get())
+        return next(self._rows).tolist()
+
+    def close(self):
+        if self._blocks is not None:
+            self._stop.set()
+
+
+SOFT = 32
+
+
+class Strategy:
+    """Player decisions compiled into dense lookup tables.
+
+    The tables are indexed by the dealer's up card value (2 to 11) and then
+    by Hand.key for hit and double, or by the pair's rank for split. Build
+    one from predicates, from the threshold rules simulate always used, or
+    load one saved as JSON.
+    """
+
+    def __init__(self, hit, double, split):
+        """hit and double are called as rule(value, soft, dealer), split
+        as rule(rank, dealer). Totals over 21 never hit or double.
+        """
+        self.hit = tuple(
+            tuple(value <= 21 and bool(hit(value, key >= SOFT, dealer))
+                  for key, value in _keys())
+            for dealer in range(12))
+        self.double = tuple(
+            tuple(value <= 21 and bool(double(value, key >= SOFT, dealer))
+                  for key, value in _keys())
+            for dealer in range(12))
+        self.split = tuple(
+            tuple(rank > 0 and bool(split(rank, dealer)) for rank in range(11))
+            for dealer in range(12))
+
+    @classmethod
+    def thresholds(cls, stand=16, margin=8, double_low=9, double_high=11, split_margin=8, split_aces=True):
+        return cls(
+            hit=lambda value, soft, dealer: value < stand and value + margin > dealer,
+            double=lambda value, soft, dealer: double_low <= value <= double_high and dealer < value,
+            split=lambda rank, dealer: rank == 1 and split_aces or rank - split_margin > dealer)
+
+    @classmethod
+    def from_tables(cls, hit, double, split):
+        return cls(
+            hit=lambda value, soft, dealer: hit[dealer][value + SOFT * soft],
+            double=lambda value, soft, dealer: double[dealer][value + SOFT * soft],
+            split=lambda rank, dealer: split[dealer][rank])
+
+    @classmethod
+    def load(cls, path):
+        """Load a strategy from JSON.
+
+        The file holds either {"thresholds": {...}} with keywords for
+        Strategy.thresholds, or "hit", "double" and "split" tables in the
+        layout written by save.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if 'thresholds' in data:
+            return cls.thresholds(**data['thresholds'])
+        return cls.from_tables(data['hit'], data['double'], data['split'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'hit': [[int(x) for x in row] for row in self.hit],
+                'double': [[int(x) for x in row] for row in self.double],
+                'split': [[int(x) for x in row] for row in self.split],
+            }, f)
+
+
+def _keys():
+    for key in range(2 * SOFT):
+        yield key, key % SOFT
+
+
+DEFAULT_STRATEGY = Strategy.thresholds()
+
+
+class Hand:
+    """Running state of a hand, updated in place as cards are added.
+
+    total counts aces as one, value is the best total counting one ace as
+    eleven where that does not bust. key is the index of the hand in the
+    Strategy tables (value, plus SOFT when an ace is counted as eleven).
+    """
+    __slots__ = ('total', 'ace', 'count', 'value', 'key', 'first', 'pair')
+
+    def __init__(self, *cards):
+        self.total = 0
+        self.ace = False
+        self.count = 0
+        self.value = 0
+        self.key = 0
+        self.first = 0
+        self.pair = False
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        if self.count == 0:
+            self.first = card
+        self.pair = self.count == 1 and card == self.first
+        self.count += 1
+        self.total += card
+        if card == 1:
+            self.ace = True
+        if self.ace and self.total <= 11:
+            self.value = self.total + 10
+            self.key = self.value + SOFT
+        else:
+            self.value = self.key = self.total
+
+    def split(self):
+        """Keep the first card only, returning the other half."""
+        card = self.first
+        self.__init__(card)
+        return Hand(card)
+
+
+class Counters:
+    """Outcome counters of a run, one fixed slot per result.
+
+    Supports merging (+, +=), differences (-) and snapshot copies, so
+    batches and workers can be combined cheaply. Results can also be read
+    by key like the dict they replace.
+    """
+    __slots__ = ('win', 'lose', 'push', 'bust', 'invested', 'winnings', 'pot')
+
+    def __init__(self, **values):
+        for key in self.__slots__:
+            setattr(self, key, values.get(key, 0))
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __iadd__(self, other):
+        for key in self.__slots__:
+            setattr(self, key, getattr(self, key) + getattr(other, key))
+        return self
+
+    def __add__(self, other):
+        return self.snapshot().__iadd__(other)
+
+    def __sub__(self, other):
+        return Counters(**{key: getattr(self, key) - getattr(other, key) for key in self.__slots__})
+
+    def __eq__(self, other):
+        return isinstance(other, Counters) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"Counters({', '.join(f'{key}={value}' for key, value in self.as_dict().items())})"
+
+    def snapshot(self):
+        return Counters(**self.as_dict())
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+# Phases of simulate, as indexes into Profile.ns.
+DEAL, BLACKJACK, SPLIT, PLAYER, DEALER, SETTLE, SHUFFLE = range(7)
+
+
+class Profile:
+    """Time spent in each phase of simulate, and what happened there.
+
+    Pass one to simulate as profile to fill it in; without one simulate
+    only pays for a few None checks.
+    """
+    phases = ('deal', 'blackjack', 'split', 'player', 'dealer', 'settle', 'shuffle')
+    __slots__ = ('ns', 'games', 'hands', 'player_hits', 'dealer_hits', 'splits', 'doubles', '_last')
+
+    def __init__(self):
+        self.ns = [0] * len(self.phases)
+        self.games = 0
+        self.hands = 0
+        self.player_hits = 0
+        self.dealer_hits = 0
+        self.splits = 0
+        self.doubles = 0
+        self._last = 0
+
+    def start(self):
+        self._last = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        self.ns[phase] += now - self._last
+        self._last = now
+
+    def report(self):
+        total = sum(self.ns) or 1
+        games = self.games or 1
+        for phase, ns in zip(self.phases, self.ns):
+            print(f"{phase.title():>10}: {ns / 1_000_000:9.1f}ms {ns / total:6.1%} {ns / games:7.0f}ns/game")
+        draws = self.hands * 2 + self.games + self.player_hits + self.dealer_hits
+        print(f"     Draws: {draws / games:.3f}/game")
+        print(f"Player Hit: {self.player_hits / games:.3f}/game")
+        print(f"Dealer Hit: {self.dealer_hits / games:.3f}/game")
+        print(f"    Splits: {self.splits / games:.4f}/game")
+        print(f"   Doubles: {self.doubles / games:.4f}/game")
+
+
+class Telemetry:
+    """Simulator metrics and spans through OpenTelemetry.
+
+    Nothing is recorded per game: the runners report whole batches, and the
+    providers' readers and span processors batch the exporting. The global
+    providers are used unless others are given, such as SDK providers with
+    in-memory exporters.
+    """
+    events = (('deal', 'hands'), ('player', 'player_hits'), ('player', 'doubles'),
+              ('split', 'splits'), ('dealer', 'dealer_hits'))
+
+    def __init__(self, meter_provider=None, tracer_provider=None):
+        self.meter_provider = meter_provider
+        self.tracer_provider = tracer_provider
+        meter = otel_metrics.get_meter('blackjack', meter_provider=meter_provider)
+        self.tracer = otel_trace.get_tracer('blackjack', tracer_provider=tracer_provider)
+        self.games = meter.create_counter('blackjack.games', unit='{game}')
+        self.hands = meter.create_counter('blackjack.hands', unit='{hand}')
+        self.rate = meter.create_histogram('blackjack.batch.rate', unit='{game}/s')
+        self.ratio = meter.create_histogram('blackjack.batch.ratio')
+        self.phase_time = meter.create_counter('blackjack.phase.time', unit='ns')
+        self.phase_events = meter.create_counter('blackjack.phase.events')
+        self.utilisation = meter.create_histogram('blackjack.worker.utilisation', unit='1')
+        self._seen = None
+
+    @classmethod
+    def otlp(cls, export_every=5.0):
+        """Export to the OTLP endpoint set in the usual OTEL_EXPORTER_OTLP_* environment variables."""
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        resource = Resource.create({'service.name': 'blackjack'})
+        reader = PeriodicExportingMetricReader(OTLPMetricExporter(), export_interval_millis=export_every * 1000)
+        tracer_provider = TracerProvider(resource=resource)
+        tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        return cls(MeterProvider([reader], resource=resource), tracer_provider)
+
+    def span(self, name, **attributes):
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+    def batch(self, games, hands, ns, results, profile=None, end=None):
+        """Record a finished batch of games that took ns nanoseconds, ending
+        at the time.time_ns() end (by default now).
+        """
+        if end is None:
+            end = time.time_ns()
+        span = self.tracer.start_span('blackjack.batch', start_time=end - ns, attributes={
+            'blackjack.games': games, 'blackjack.hands': hands, 'blackjack.pot': results.pot,
+            'blackjack.invested': results.invested})
+        span.end(end_time=end)
+        self.games.add(games)
+        self.hands.add(hands)
+        if ns:
+            self.rate.record(games * 1e9 / ns)
+        if results.invested:
+            self.ratio.record(ratio(results))
+        if profile is not None:
+            seen = (tuple(profile.ns),) + tuple(getattr(profile, name) for _, name in self.events)
+            last = self._seen or ((0,) * len(profile.phases),) + (0,) * len(self.events)
+            for phase, ns, last_ns in zip(profile.phases, seen[0], last[0]):
+                self.phase_time.add(ns - last_ns, {'phase': phase})
+            for (phase, name), count, last_count in zip(self.events, seen[1:], last[1:]):
+                self.phase_events.add(count - last_count, {'phase': phase, 'event': name})
+            self._seen = seen
+
+    def workers(self, busy_ns, wall_ns, workers):
+        """Record the share of workers' wall time spent playing."""
+        if wall_ns:
+            self.utilisation.record(busy_ns / (wall_ns * workers))
+
+    def shutdown(self):
+        for provider in (self.meter_provider, self.tracer_provider):
+            if provider is not None:
+                provider.shutdown()
+
+
+def simulate(shoe, bets, players, results, strategy=DEFAULT_STRATEGY, profile=None):
+    if profile is not None:
+        profile.start()
+    hands = [Hand() for _ in range(players)]
+    dealer = Hand()
+    draw = shoe.draw
 
     for _ in range(2):
         for player in range(players):
-            hands[player].append(draw())
+            hands[player].add(draw())
 
-    dealer.append(draw())
-    dealer_sum = sum_a11(dealer)
+    dealer.add(draw())
+    dealer_sum = dealer.value
+    hit = strategy.hit[dealer_sum]
+    double = strategy.double[dealer_sum]
+    split = strategy.split[dealer_sum]
+    if profile is not None:
+        profile.lap(DEAL)
 
     # payout for blackjack
     for player in range(players):
-        if sum_a11(hands[player]) == 21:
+        if hands[player].value == 21:
             if dealer_sum < 10:
-                results['win'] += 1
-                results['invested'] += bets[player]
-                results['winnings'] += bets[player] * 1.5
-                results['pot'] += bets[player] * 2.5
+                results.win += 1
+                results.invested += bets[player]
+                results.winnings += bets[player] * 1.5
+                results.pot += bets[player] * 2.5
                 hands[player] = None
             elif dealer_sum == 11:
                 # even money
-                results['win'] += 1
-                results['invested'] += bets[player]
-                results['winnings'] += bets[player]
-                results['pot'] += bets[player] * 2
+                results.win += 1
+                results.invested += bets[player]
+                results.winnings += bets[player]
+                results.pot += bets[player] * 2
                 hands[player] = None
+    if profile is not None:
+        profile.lap(BLACKJACK)
 
     # split on double
     for player in range(players):
         if hands[player] is None:
             continue
-        card1, card2 = hands[player]
-        if card1 == card2 and (card1 == 1 or card1 - 8 > dealer_sum):
-            hands[player] = [card1]
-            hands.append([card1])
+        hand = hands[player]
+        if hand.pair and split[hand.first]:
+            hands.append(hand.split())
             # # hands[player] = [1, draw()]
             # # hands.append([1, draw()])
             bets.append(bets[player])
+    if profile is not None:
+        profile.splits += len(hands) - players
+        profile.lap(SPLIT)
 
     for player in range(players):
         doubled = False
-        if hands[player] is None:
+        hand = hands[player]
+        if hand is None:
             continue
         while True:
-            player_sum = sum_a11(hands[player])
             # double bet
-            if not doubled and 9 <= player_sum <= 11 and dealer_sum < player_sum:
+            if not doubled and double[hand.key]:
                 bets[player] *= 2
                 doubled = True
-            # if player_sum >= 14 or player_sum >=12 and dealer_sum > 2:# or player_sum == 12 and dealer_sum >3:# or dealer_sum < player_sum:# and dealer_sum >= 5:
-            if player_sum < 16 and player_sum + 8 > dealer_sum:
-                hands[player].append(draw())
+                if profile is not None:
+                    profile.doubles += 1
+            if hit[hand.key]:
+                hand.add(draw())
+                if profile is not None:
+                    profile.player_hits += 1
             else:
                 break
+    if profile is not None:
+        profile.lap(PLAYER)
+
+    while dealer.value < 17:
+        dealer.add(draw())
+    if profile is not None:
+        profile.dealer_hits += dealer.count - 1
+        profile.lap(DEALER)
 
-    while sum_a11(dealer) < 17:
-        dealer.append(draw())
-    
-    dealer_sum = sum_a11(dealer)
+    dealer_sum = dealer.value
     for player in range(players):
         if hands[player] is None:
             continue
-        player_sum = sum_a11(hands[player])
+        player_sum = hands[player].value
         bet = bets[player]
-        results['invested'] += bet
+        results.invested += bet
         if player_sum > 21:
-            results['bust'] += 1
+            results.bust += 1
         elif dealer_sum > 21 or player_sum > dealer_sum:
-            results['win'] += 1
-            results['winnings'] += bet
-            results['pot'] += bet * 2
+            results.win += 1
+            results.winnings += bet
+            results.pot += bet * 2
         elif player_sum == dealer_sum:
-            results['push'] += 1
-            results['pot'] += bet
+            results.push += 1
+            results.pot += bet
         else:
-            results['lose'] += 1
+            results.lose += 1
+
+    if profile is not None:
+        profile.games += 1
+        profile.hands += players
+        profile.lap(SETTLE)
+
+    shoe.end_round()
+    if profile is not None:
+        profile.lap(SHUFFLE)
 
 
 def get_cards(decks):
     return [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10] * 4 * decks
 
 
-def main():
+def _sum_a11(total, ace):
+    """Vectorized Hand.value over running hard totals and ace flags."""
+    return np.where(ace & (total + 10 <= 21), total + 10, total)
+
+
+def _soft(total, ace):
+    return ace & (total + 10 <= 21)
+
+
+def _play_batch(shoes, cursor, bet_per_game, players, results, strategy=DEFAULT_STRATEGY):
+    """Play one game per row of shoes, following the same rules as simulate.
+
+    Each game starts dealing at its row's cursor, which is left pointing
+    past the last card used. A cursor running off the end wraps back to the
+    start of its shoe, much like draw() recycling cards in simulate.
+    """
+    rows = np.arange(len(shoes))
+    size = shoes.shape[1]
+
+    def draw(mask):
+        idx = rows[mask]
+        card = shoes[idx, cursor[idx] % size].astype(np.int16)
+        cursor[idx] += 1
+        return card
+
+    everyone = np.ones(len(shoes), dtype=bool)
+    first = [None] * players
+    second = [None] * players
+    for round_ in (first, second):
+        for player in range(players):
+            round_[player] = draw(everyone)
+
+    up = draw(everyone)
+    dealer_sum = np.where(up == 1, 11, up)
+    hit = np.array(strategy.hit)
+    double_ = np.array(strategy.double)
+    split_ = np.array(strategy.split)
+
+    totals = []
+    aces = []
+    active = []
+    for player in range(players):
+        card1, card2 = first[player], second[player]
+        total = card1 + card2
+        ace = (card1 == 1) | (card2 == 1)
+
+        # payout for blackjack
+        natural = _sum_a11(total, ace) == 21
+        paid = natural & (dealer_sum < 10)
+        even = natural & (dealer_sum == 11)
+        results.win += int(np.count_nonzero(paid | even))
+        results.invested += (bet_per_game * np.count_nonzero(paid | even)).item()
+        results.winnings += (bet_per_game * (1.5 * np.count_nonzero(paid) + np.count_nonzero(even))).item()
+        results.pot += (bet_per_game * (2.5 * np.count_nonzero(paid) + 2 * np.count_nonzero(even))).item()
+        playing = ~(paid | even)
+
+        # split on double; like simulate, only the first half is played on
+        split = playing & (card1 == card2) & split_[dealer_sum, card1]
+        total = np.where(split, card1, total)
+        ace = np.where(split, card1 == 1, ace)
+
+        totals.append(total)
+        aces.append(ace)
+        active.append(playing)
+
+    bets = []
+    for player in range(players):
+        total, ace = totals[player], aces[player]
+        bet = np.full(len(shoes), bet_per_game)
+        doubled = np.zeros(len(shoes), dtype=bool)
+        hitting = active[player].copy()
+        while True:
+            soft = _soft(total, ace)
+            key = total + 10 * soft + SOFT * soft
+            # double bet
+            double = hitting & ~doubled & double_[dealer_sum, key]
+            bet = np.where(double, bet * 2, bet)
+            doubled |= double
+            hitting &= hit[dealer_sum, key]
+            if not hitting.any():
+                break
+            card = draw(hitting)
+            total[hitting] += card
+            ace[hitting] |= card == 1
+        bets.append(bet)
+
+    dealer_total = up.copy()
+    dealer_ace = up == 1
+    while True:
+        hitting = _sum_a11(dealer_total, dealer_ace) < 17
+        if not hitting.any():
+            break
+        card = draw(hitting)
+        dealer_total[hitting] += card
+        dealer_ace[hitting] |= card == 1
+
+    dealer_sum = _sum_a11(dealer_total, dealer_ace)
+    for player in range(players):
+        playing = active[player]
+        bet = bets[player]
+        player_sum = _sum_a11(totals[player], aces[player])
+        bust = playing & (player_sum > 21)
+        win = playing & ~bust & ((dealer_sum > 21) | (player_sum > dealer_sum))
+        push = playing & ~bust & ~win & (player_sum == dealer_sum)
+        lose = playing & ~bust & ~win & ~push
+        results.invested += bet[playing].sum().item()
+        results.bust += int(np.count_nonzero(bust))
+        results.win += int(np.count_nonzero(win))
+        results.winnings += bet[win].sum().item()
+        results.pot += (bet[win].sum() * 2 + bet[push].sum()).item()
+        results.push += int(np.count_nonzero(push))
+        results.lose += int(np.count_nonzero(lose))
+
+
+def simulate_batch(games, decks=8, players=1, bet_per_game=1, seed=None, shoes=1 << 14, penetration=0.75,
+                   strategy=DEFAULT_STRATEGY):
+    """Play many games at once as arrays.
+
+    Games are dealt side by side from a stack of pre-shuffled shoes, one
+    game per shoe per round. A shoe is reshuffled once it has been dealt
+    past the penetration point. The results are statistically comparable
+    with (not identical to) calling simulate in a loop, and use the same
+    keys.
+    """
+    rng = np.random.default_rng(seed)
+    cards = np.array(get_cards(decks), dtype=np.int8)
+    shoes = min(shoes, games)
+    stack = rng.permuted(np.broadcast_to(cards, (shoes, len(cards))), axis=1)
+    cursor = np.zeros(shoes, dtype=np.intp)
+    cut = int(len(cards) * penetration)
+    results = Counters()
+    while games > 0:
+        n = min(shoes, games)
+        _play_batch(stack[:n], cursor[:n], bet_per_game, players, results, strategy)
+        games -= n
+        spent = cursor >= cut
+        if spent.any():
+            stack[spent] = rng.permuted(stack[spent], axis=1)
+            cursor[spent] = 0
+    return results
+
+
+def get_counts(decks):
+    """Shoe composition as counts of each rank, ace first."""
+    cards = get_cards(decks)
+    return tuple(cards.count(rank) for rank in range(1, 11))
+
+
+def _take(counts, i):
+    return counts[:i] + (counts[i] - 1,) + counts[i + 1:]
+
+
+@functools.lru_cache(maxsize=None)
+def _dealer_draws(up):
+    """Every set of cards the dealer can draw after showing up.
+
+    The chance of drawing a given set only depends on the shoe through
+    falling factorials of its counts, so each set is stored as a row
+    picking its log terms out of the table built by dealer_outcomes. The
+    second matrix adds up each set's probability, times the number of
+    orders the dealer would actually draw it in, into its outcome.
+    """
+    draws = {}
+
+    def deal(total, ace, drawn):
+        value = total + 10 if ace and total <= 11 else total
+        if value >= 17:
+            key = tuple(drawn)
+            if key not in draws:
+                draws[key] = [0, 5 if value > 21 else value - 17]
+            draws[key][0] += 1
+            return
+        for i in range(10):
+            drawn[i] += 1
+            deal(total + i + 1, ace or i == 0, drawn)
+            drawn[i] -= 1
+
+    deal(up, up == 1, [0] * 10)
+    depth = max(map(sum, draws)) + 1
+    select = np.zeros((len(draws), 11 * depth))
+    outcomes = np.zeros((6, len(draws)))
+    for row, (drawn, (orders, outcome)) in enumerate(draws.items()):
+        for i, count in enumerate(drawn):
+            select[row, i * depth + count] = 1
+        select[row, 10 * depth + sum(drawn)] = -1
+        outcomes[outcome, row] = orders
+    return select, outcomes, depth
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def dealer_outcomes(counts, up):
+    """Distribution of the dealer's final value when drawing from counts.
+
+    counts are the cards left in the shoe as from get_counts and up is the
+    dealer's first card. Returns the probabilities of standing on 17, 18,
+    19, 20 and 21 and of busting.
+    """
+    select, outcomes, depth = _dealer_draws(up)
+    n = np.array(counts + (sum(counts),), dtype=float)[:, None]
+    falling = np.cumprod(np.hstack((np.ones_like(n), n - np.arange(depth - 1))), axis=1)
+    with np.errstate(divide='ignore'):
+        # Sets needing more of a rank than is left get a probability of 0,
+        # which the empty shoe's denominator must not cancel out.
+        log_falling = np.maximum(np.log(falling), -1e4)
+    log_falling[-1, falling[-1] == 0] = 0
+    return tuple((outcomes @ np.exp(select @ log_falling.ravel())).tolist())
+
+
+EXACT_KEYS = ('invested', 'pot', 'winnings', 'win', 'push', 'lose', 'bust')
+
+
+def exact_deals(decks=8, strategy=DEFAULT_STRATEGY, counts=None, cache_size=1 << 16):
+    """Exact expected results of one game for one player betting 1, for
+    every initial deal.
+
+    Plays every deal from a shoe of decks, or of the composition in counts
+    if given, by memoized recursion over the cards left, following the
+    same rules as simulate. Returns a dict from (card1, card2, up) to the
+    probability of that deal and the expected EXACT_KEYS given it.
+    """
+
+    @functools.lru_cache(maxsize=cache_size)
+    def play(counts, total, ace, doubled, up):
+        dealer_sum = 11 if up == 1 else up
+        value = total + 10 if ace and total <= 11 else total
+        key = value + SOFT if value != total else value
+        if not doubled and strategy.double[dealer_sum][key]:
+            doubled = True
+        if strategy.hit[dealer_sum][key]:
+            n = sum(counts)
+            out = [0.0] * len(EXACT_KEYS)
+            for i, count in enumerate(counts):
+                if count:
+                    p = count / n
+                    for j, x in enumerate(play(_take(counts, i), total + i + 1, ace or i == 0, doubled, up)):
+                        out[j] += p * x
+            return tuple(out)
+
+        bet = 2 if doubled else 1
+        if value > 21:
+            return bet, 0, 0, 0, 0, 0, 1
+        dealer = dealer_outcomes(counts, up)
+        push = dealer[value - 17] if value >= 17 else 0
+        win = dealer[5] + sum(dealer[:max(value - 17, 0)])
+        lose = 1 - win - push
+        return bet, bet * (2 * win + push), bet * win, win, push, lose, 0
+
+    deals = {}
+    counts = tuple(counts or get_counts(decks))
+    n = sum(counts)
+    for i, card1 in enumerate(counts):
+        after1 = _take(counts, i)
+        for j, card2 in enumerate(after1):
+            after2 = _take(after1, j)
+            for k, card3 in enumerate(after2):
+                p = card1 / n * card2 / (n - 1) * card3 / (n - 2)
+                if not p:
+                    continue
+                rest = _take(after2, k)
+                c1, c2, up = i + 1, j + 1, k + 1
+                dealer_sum = 11 if up == 1 else up
+                natural = {c1, c2} == {1, 10}
+                if natural and dealer_sum != 10:
+                    # payout for blackjack, even money against an ace
+                    outcome = (1, 2.5, 1.5, 1, 0, 0, 0) if dealer_sum < 10 else (1, 2, 1, 1, 0, 0, 0)
+                elif c1 == c2 and strategy.split[dealer_sum][c1]:
+                    outcome = play(rest, c1, c1 == 1, False, up)
+                else:
+                    outcome = play(rest, c1 + c2, c1 == 1 or c2 == 1, False, up)
+                deals[c1, c2, up] = p, outcome
+    return deals
+
+
+def exact(decks=8, strategy=DEFAULT_STRATEGY, counts=None, cache_size=1 << 16):
+    """Exact expected results of one game for one player betting 1.
+
+    Returns a dict with the results keys holding expected values per game
+    over every deal from exact_deals, plus the ratio.
+    """
+    expected = [0.0] * len(EXACT_KEYS)
+    for p, outcome in exact_deals(decks, strategy, counts, cache_size).values():
+        for m, x in enumerate(outcome):
+            expected[m] += p * x
+    results = dict(zip(EXACT_KEYS, expected))
+    results['ratio'] = ratio(results)
+    return results
+
+
+def play_shoes(shoes, players=1, bet_per_game=1, strategy=DEFAULT_STRATEGY):
+    """Play one game from the top of each row of a 2-D array of shoes.
+
+    Lets several strategies be played over exactly the same cards.
+    """
+    results = Counters()
+    _play_batch(shoes, np.zeros(len(shoes), dtype=np.intp), bet_per_game, players, results, strategy)
+    return results
+
+
+def ratio(results):
+    return results['pot'] / results['invested']
+
+
+def run_batch(games, seed, decks=8, players=1, bet_per_game=1, penetration=0.75, strategy=DEFAULT_STRATEGY,
+              bulk=False):
+    """Play games on a private shoe shuffled from its own seeded stream.
+
+    With bulk, the shoes come from a ShoeSource seeded the same way.
+    """
+    source = ShoeSource(decks, seed) if bulk else None
+    shoe = Shoe(decks, penetration, rng=random.Random(seed), source=source)
+    results = Counters()
+    for _ in range(games):
+        simulate(shoe, bets=[bet_per_game] * players, players=players, results=results, strategy=strategy)
+    return results
+
+
+def _run_timed(games, seed, **kw):
+    start = time.perf_counter_ns()
+    results = run_batch(games, seed, **kw)
+    return time.perf_counter_ns() - start, time.time_ns(), results
+
+
+def run_sharded(games, batches=64, seed=0, workers=None, telemetry=None, **kw):
+    """Split games into batches and play them across a process pool.
+
+    Each batch gets its own shoe and a seed drawn from the master seed, so
+    the totals only depend on seed and batches, never on workers. Keywords
+    are passed on to run_batch. Returns merged results and one ratio sample
+    per batch. There are never more batches than games.
+    """
+    batches = min(batches, games)
+    master = random.Random(seed)
+    seeds = [master.getrandbits(64) for _ in range(batches)]
+    sizes = [games // batches + (i < games % batches) for i in range(batches)]
+    if telemetry is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            batch_results = list(pool.map(partial(run_batch, **kw), sizes, seeds))
+    else:
+        with telemetry.span('blackjack.run_sharded', games=games, batches=batches):
+            start = time.perf_counter_ns()
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                timed = list(pool.map(partial(_run_timed, **kw), sizes, seeds))
+            wall = time.perf_counter_ns() - start
+            players = kw.get('players', 1)
+            for size, (ns, end, batch) in zip(sizes, timed):
+                telemetry.batch(size, size * players, ns, batch, end=end)
+            telemetry.workers(sum(ns for ns, _, _ in timed), wall, workers or os.cpu_count())
+        batch_results = [batch for _, _, batch in timed]
+
+    results = Counters()
+    for batch in batch_results:
+        results += batch
+    ratio_samples = [ratio(batch) for batch in batch_results]
+    return results, ratio_samples
+
+
+class RunningRatio:
+    """Streaming estimate of the return ratio from per game pot and invested.
+
+    Keeps Welford running means, variances and the covariance of the two,
+    so the confidence interval of the ratio (by the delta method) can be
+    read at any point without storing the games.
+    """
+    __slots__ = ('n', 'mean_pot', 'mean_invested', 'm2_pot', 'm2_invested', 'co_moment')
+
+    def __init__(self):
+        self.n = 0
+        self.mean_pot = 0.0
+        self.mean_invested = 0.0
+        self.m2_pot = 0.0
+        self.m2_invested = 0.0
+        self.co_moment = 0.0
+
+    def add(self, pot, invested):
+        self.n += 1
+        d_pot = pot - self.mean_pot
+        d_invested = invested - self.mean_invested
+        self.mean_pot += d_pot / self.n
+        self.mean_invested += d_invested / self.n
+        self.m2_pot += d_pot * (pot - self.mean_pot)
+        self.m2_invested += d_invested * (invested - self.mean_invested)
+        self.co_moment += d_pot * (invested - self.mean_invested)
+
+    @property
+    def ratio(self):
+        return self.mean_pot / self.mean_invested
+
+    def half_width(self, z=1.96):
+        if self.n < 2:
+            return float('inf')
+        r = self.ratio
+        var = (self.m2_pot - 2 * r * self.co_moment + r * r * self.m2_invested) / (self.n - 1)
+        return z * (max(var, 0.0) / self.n) ** 0.5 / self.mean_invested
+
+
+def run_until(half_width=0.001, max_games=20_000_000, min_games=10_000, report_every=100_000,
+              seed=None, decks=8, players=1, bet_per_game=1, penetration=0.75, strategy=DEFAULT_STRATEGY):
+    """Play until the ratio's 95% confidence interval is within half_width.
+
+    The interval is checked every thousand games. Stops after max_games
+    regardless, and never before min_games. Prints
+    the running estimate every report_every games. Returns the results and
+    the RunningRatio.
+    """
+    shoe = Shoe(decks, penetration, rng=random.Random(seed))
+    results = Counters()
+    stats = RunningRatio()
+    while stats.n < max_games:
+        pot, invested = results.pot, results.invested
+        simulate(shoe, bets=[bet_per_game] * players, players=players, results=results, strategy=strategy)
+        stats.add(results.pot - pot, results.invested - invested)
+        if stats.n % report_every == 0:
+            print(f"{stats.n:>10}: {stats.ratio:.4f} ± {stats.half_width():.4f}")
+        if stats.n % 1000 == 0 and stats.n >= min_games and stats.half_width() <= half_width:
+            break
+    return results, stats
+
+
+def run_reduced(games, seed=None, antithetic=True, control=True, decks=8, players=1, bet_per_game=1,
+                penetration=0.75, strategy=DEFAULT_STRATEGY):
+    """Estimate the return ratio with variance reduction.
+
+    With antithetic, every game is paired with a twin dealt from the same
+    cards with the first player's two cards swapped for the dealer's up
+    card and the card after it. Swapping places in a random shoe leaves it
+    random, so the twin is an ordinary game, but a strong start for the
+    player tends to become one for the dealer. With control, the estimate
+    is corrected by regressing on the expected pot and investment given
+    each player's initial deal, which exact_deals knows along with their
+    overall means. The twins come in pairs, so with antithetic an odd games
+    is rounded up by one. A shoe too near its end to read the next deal
+    from is reshuffled first, as if its cut card had come out.
+
+    Returns the ratio, its 95% interval half-width, the half-width the same
+    games would give with neither, and the effective sample size: how many
+    plain games would be as precise.
+    """
+    rng = random.Random(seed)
+    shoe = Shoe(decks, penetration, rng=rng)
+    twin = Shoe(decks, penetration, rng=rng)
+    # The twin deals from the main shoe's cards and never reshuffles them.
+    twin.cut = len(twin.cards) + 1
+    deals = exact_deals(decks, strategy)
+    # EXACT_KEYS starts with invested then pot.
+    means = [players * sum(p * outcome[k] for p, outcome in deals.values()) for k in (1, 0)]
+    deals = {deal: outcome[:2] for deal, (_, outcome) in deals.items()}
+    results = Counters()
+    # Sums of outer products of (pot, invested, 1) per game, and of
+    # (pot, invested, centred controls, 1) per sample, flushed through
+    # numpy in chunks.
+    single, paired = np.zeros((3, 3)), np.zeros((5, 5))
+    game_rows, sample_rows = [], []
+
+    def play(shoe_, sample):
+        up = shoe_.peek(2 * players)
+        for player in range(players):
+            invested, pot = deals[shoe_.peek(player), shoe_.peek(players + player), up]
+            sample[2] += pot
+            sample[3] += invested
+        sample[2] -= means[0]
+        sample[3] -= means[1]
+        pot, invested = results.pot, results.invested
+        simulate(shoe_, bets=[bet_per_game] * players, players=players, results=results, strategy=strategy)
+        pot, invested = results.pot - pot, results.invested - invested
+        game_rows.append((pot, invested, 1.0))
+        sample[0] += pot
+        sample[1] += invested
+
+    def flush(rows, sums):
+        if rows:
+            x = np.array(rows)
+            sums += x.T @ x
+            rows.clear()
+
+    if antithetic:
+        games += games % 2
+    played = 0
+    while played < games:
+        sample = [0.0] * 4
+        if shoe.pos + 2 * players + 1 >= len(shoe.cards):
+            # The initial deal and the card after it must all be in the shoe.
+            shoe.shuffle()
+        if antithetic:
+            cards, first, up = shoe.cards, shoe.pos, shoe.pos + 2 * players
+            swap = (first, up), (first + players, up + 1)
+            for i, j in swap:
+                cards[i], cards[j] = cards[j], cards[i]
+            twin.cards = cards
+            twin.pos = twin.round_start = first
+            play(twin, sample)
+            for i, j in reversed(swap):
+                cards[i], cards[j] = cards[j], cards[i]
+            played += 1
+        play(shoe, sample)
+        played += 1
+        sample_rows.append(sample + [1.0])
+        if len(sample_rows) >= 4096:
+            flush(game_rows, single)
+            flush(sample_rows, paired)
+    flush(game_rows, single)
+    flush(sample_rows, paired)
+
+    def covariance(sums):
+        n = sums[-1, -1]
+        mean = sums[:, -1] / n
+        return (sums / n - np.outer(mean, mean)) * n / (n - 1)
+
+    n_games, n_samples = single[2, 2], paired[4, 4]
+    invested = single[1, 2]
+    r = single[0, 2] / invested
+    # Variance of pot - r * invested, the linearised error of the ratio.
+    z = np.array([1, -r, 0, 0, 0])
+    var_single = z[[0, 1, 4]] @ covariance(single) @ z[[0, 1, 4]]
+    cov = covariance(paired)
+    var_sample = z @ cov @ z
+    if control:
+        beta = np.linalg.lstsq(cov[2:4, 2:4], cov[2:4] @ z, rcond=None)[0]
+        var_sample -= (cov[:, 2:4] @ beta) @ z
+        r -= beta @ paired[2:4, 4] / invested
+
+    effective = n_games ** 2 * var_single / (n_samples * var_sample)
+    return {
+        'games': int(n_games),
+        'ratio': float(r),
+        'half_width': float(1.96 * (var_sample * n_samples) ** 0.5 / invested),
+        'plain_half_width': float(1.96 * (var_single * n_games) ** 0.5 / invested),
+        'effective_games': float(effective),
+        'gain': float(effective / n_games),
+    }
+
+
+class BatchLog:
+    """Fixed size memory-mapped file of per batch Counters.
+
+    The first 8 bytes hold how many batches have been written, followed by
+    one record of float64s per batch in Counters slot order. Another
+    process can map the same file with read_progress while a run is going.
+    """
+    fields = len(Counters.__slots__)
+
+    def __init__(self, path, batches):
+        size = 8 * (1 + batches * self.fields)
+        mode = 'r+b' if os.path.exists(path) and os.path.getsize(path) == size else 'w+b'
+        with open(path, mode) as f:
+            f.truncate(size)
+            self._map = mmap.mmap(f.fileno(), size)
+
+    @property
+    def count(self):
+        return array('q', self._map[:8])[0]
+
+    @count.setter
+    def count(self, count):
+        self._map[:8] = array('q', [count]).tobytes()
+
+    def append(self, counters):
+        start = 8 * (1 + self.count * self.fields)
+        record = array('d', (getattr(counters, key) for key in Counters.__slots__))
+        self._map[start:start + 8 * self.fields] = record.tobytes()
+        # Only count the record once it is all there.
+        self.count += 1
+
+    def close(self):
+        self._map.close()
+
+
+def read_progress(path):
+    """Counters of every batch written so far to a BatchLog file."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        count = array('q', m[:8])[0]
+        values = array('d', m[8:8 + 8 * count * BatchLog.fields])
+    values = [int(x) if x.is_integer() else x for x in values]
+    return [Counters(**dict(zip(Counters.__slots__, values[i:i + BatchLog.fields])))
+            for i in range(0, len(values), BatchLog.fields)]
+
+
+def _save_checkpoint(path, state):
+    # Write then rename, so a kill never leaves a half written checkpoint.
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+def run_checkpointed(games, path, seed=None, batches=10, checkpoint_every=100_000, decks=8, players=1,
+                     bet_per_game=1, penetration=0.75, strategy=DEFAULT_STRATEGY):
+    """Play games in batches, checkpointing so a killed run can resume.
+
+    The checkpoint at path holds the totals, the current batch, the batch
+    ratio samples, the shoe order and the random state, and is rewritten
+    after every batch and every checkpoint_every games. If it exists the run
+    carries on from it, giving the same totals as an uninterrupted run
+    (the strategy is not saved, so pass the same one again). Each finished
+    batch is also appended to the BatchLog at path + '.log'. Batches are
+    split like run_sharded's, never more than games. Returns the results
+    and ratio samples.
+    """
+    batches = min(batches, games)
+    settings = {'games': games, 'seed': seed, 'batches': batches, 'decks': decks, 'players': players,
+                'bet_per_game': bet_per_game, 'penetration': penetration}
+    rng = random.Random(seed)
+    shoe = Shoe(decks, penetration, rng=rng)
+    results, batch_results = Counters(), Counters()
+    ratio_samples = []
+    played = 0
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if state['settings'] != settings:
+            raise ValueError(f"{path} is a checkpoint of a different run: {state['settings']}")
+        played = state['played']
+        results = Counters(**state['results'])
+        batch_results = Counters(**state['batch_results'])
+        ratio_samples = state['ratio_samples']
+        shoe.cards, shoe.pos, shoe.round_start = state['shoe']
+        version, internal, gauss = state['rng']
+        rng.setstate((version, tuple(internal), gauss))
+
+    log = BatchLog(path + '.log', batches)
+    # Drop any batch logged after the checkpoint was taken.
+    log.count = len(ratio_samples)
+    ends = list(itertools.accumulate(games // batches + (i < games % batches) for i in range(batches)))
+
+    def checkpoint():
+        _save_checkpoint(path, {
+            'settings': settings,
+            'played': played,
+            'results': results.as_dict(),
+            'batch_results': batch_results.as_dict(),
+            'ratio_samples': ratio_samples,
+            'shoe': [shoe.cards, shoe.pos, shoe.round_start],
+            'rng': rng.getstate(),
+        })
+
+    try:
+        while played < games:
+            simulate(shoe, bets=[bet_per_game] * players, players=players, results=batch_results,
+                     strategy=strategy)
+            played += 1
+            if played == ends[len(ratio_samples)]:
+                ratio_samples.append(ratio(batch_results))
+                results += batch_results
+                log.append(batch_results)
+                batch_results = Counters()
+                checkpoint()
+            elif played % checkpoint_every == 0:
+                checkpoint()
+    finally:
+        log.close()
+    return results, ratio_samples
+
+
+def report(games, elapsed, results, ratio_samples):
+    print(f"     Games: {games}")
+    print(f"      Time: {elapsed / 1_000_000_000:.3f}s")
+    print(f"      Wins: {results.win}")
+    print(f"    Losses: {results.lose}")
+    print(f"    Pushes: {results.push}")
+    print(f"     Busts: {results.bust}")
+    print(f"  Invested: {results.invested}")
+    print(f"  Winnings: {results.winnings}")
+    print(f"       Pot: {results.pot}")
+    print(f"House Edge: {1 - (results.win + results.push) / (results.lose + results.bust):.4f}")
+    print(f"     Ratio: {ratio(results):.4f} (min: {min(ratio_samples):.4f}, max: {max(ratio_samples):.4f}, mean: {statistics.mean(ratio_samples):.4f}, σ: {statistics.stdev(ratio_samples):.4f})")
+
+
+def main(profile=None, bulk=False, telemetry=None):
     start = time.time_ns()
-    results = defaultdict(int)
-    cards = get_cards(decks=8)
+    results = Counters()
+    source = ShoeSource(decks=8, background=True) if bulk else None
+    shoe = Shoe(decks=8, source=source)
     games = 170_000
     batches = 10
     bet_per_game = 1
     players = 1
-    ratio = lambda results: results['pot'] / results['invested']  # noqa
     ratio_samples = []
-    batch_results = defaultdict(int)
+    batch_results = Counters()
+    batch_start = time.perf_counter_ns()
+    batch_games = 0
     for i in range(games):
-        simulate(cards, bets=[bet_per_game] * players, players=players, results=batch_results)
-        if i % 8 == 0:
-            random.shuffle(cards)
+        simulate(shoe, bets=[bet_per_game] * players, players=players, results=batch_results, profile=profile)
+        batch_games += 1
         if i % (games // batches) == ((games // batches) // 2):
             ratio_samples.append(ratio(batch_results))
-            for key in batch_results:
-                results[key] += batch_results[key]
-            batch_results = defaultdict(int)
+            results += batch_results
+            if telemetry is not None:
+                now = time.perf_counter_ns()
+                telemetry.batch(batch_games, batch_games * players, now - batch_start, batch_results, profile)
+                batch_start = now
+                batch_games = 0
+            batch_results = Counters()
 
-    print(f"     Games: {games}")
+    if source is not None:
+        source.close()
+    report(games, time.time_ns() - start, results, ratio_samples)
+    if profile is not None:
+        profile.report()
+
+
+def main_parallel(workers=None, seed=0, strategy=DEFAULT_STRATEGY, telemetry=None):
+    start = time.time_ns()
+    games = 1_700_000
+    results, ratio_samples = run_sharded(games, batches=64, seed=seed, workers=workers, telemetry=telemetry,
+                                         decks=8, players=1, bet_per_game=1, strategy=strategy)
+    report(games, time.time_ns() - start, results, ratio_samples)
+
+
+def compare_strategies(paths, games=1_700_000, seed=0, workers=None):
+    """Play each strategy file over the same seeded shoes and print ratios."""
+    for path in paths:
+        results, ratio_samples = run_sharded(games, seed=seed, workers=workers, strategy=Strategy.load(path))
+        print(f"{path}: {ratio(results):.4f} (σ: {statistics.stdev(ratio_samples):.4f})")
+
+
+def main_exact(decks=8, strategy=DEFAULT_STRATEGY):
+    start = time.time_ns()
+    results = exact(decks, strategy)
+    print(f"     Decks: {decks}")
     print(f"      Time: {(time.time_ns() - start) / 1_000_000_000:.3f}s")
-    print(f"      Wins: {results['win']}")
-    print(f"    Losses: {results['lose']}")
-    print(f"    Pushes: {results['push']}")
-    print(f"     Busts: {results['bust']}")
-    print(f"  Invested: {results['invested']}")
-    print(f"  Winnings: {results['winnings']}")
-    print(f"       Pot: {results['pot']}")
-    print(f"House Edge: {1 - (results['win'] + results['push']) / (results['lose'] + results['bust']):.4f}")
-    print(f"     Ratio: {ratio(results):.4f} (min: {min(ratio_samples):.4f}, max: {max(ratio_samples):.4f}, mean: {statistics.mean(ratio_samples):.4f}, σ: {statistics.stdev(ratio_samples):.4f})")
+    for key in EXACT_KEYS:
+        print(f"{key.title():>10}: {results[key]:.6f}")
+    print(f"     Ratio: {results['ratio']:.6f}")
+
+
+def main_converge(half_width=0.002, seed=None):
+    start = time.time_ns()
+    results, stats = run_until(half_width, seed=seed)
+    print(f"     Games: {stats.n}")
+    print(f"      Time: {(time.time_ns() - start) / 1_000_000_000:.3f}s")
+    print(f"     Ratio: {stats.ratio:.4f} ± {stats.half_width():.4f} (95% CI)")
+
+
+def main_reduced(games=170_000, seed=None):
+    start = time.time_ns()
+    reduced = run_reduced(games, seed=seed)
+    print(f"     Games: {reduced['games']}")
+    print(f"      Time: {(time.time_ns() - start) / 1_000_000_000:.3f}s")
+    print(f"     Ratio: {reduced['ratio']:.4f} ± {reduced['half_width']:.4f} (plain: ± {reduced['plain_half_width']:.4f})")
+    print(f"       ESS: {reduced['effective_games']:.0f} ({reduced['gain']:.2f}x)")
+
+
+def main_checkpointed(path='blackjack.checkpoint', seed=0):
+    start = time.time_ns()
+    games = 1_700_000
+    results, ratio_samples = run_checkpointed(games, path, seed=seed)
+    report(games, time.time_ns() - start, results, ratio_samples)
 
 
-if __name__ == '__main__':  
-    main()
+if __name__ == '__main__':
+    telemetry = Telemetry.otlp() if '--otel' in sys.argv else None
+    if '--checkpoint' in sys.argv:
+        main_checkpointed()
+    elif '--reduce' in sys.argv:
+        main_reduced()
+    elif '--converge' in sys.argv:
+        main_converge()
+    elif '--exact' in sys.argv:
+        main_exact()
+    elif '--compare' in sys.argv:
+        compare_strategies(sys.argv[sys.argv.index('--compare') + 1:])
+    elif '--parallel' in sys.argv:
+        main_parallel(telemetry=telemetry)
+    else:
+        main(Profile() if '--profile' in sys.argv else None, bulk='--bulk' in sys.argv, telemetry=telemetry)
+    if telemetry is not None:
+        telemetry.shutdown()
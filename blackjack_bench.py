@@ -0,0 +1,115 @@
+"""Blackjack simulator benchmarks
+
+Times the simulator engines in hands per second (games times players) and
+keeps the results as JSON baselines, so a slower hot path shows up against
+an earlier run.
+
+    python blackjack_bench.py --save baseline.json
+    python blackjack_bench.py --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import time
+
+import blackjack
+
+STRATEGIES = {
+    'default': blackjack.DEFAULT_STRATEGY,
+    'stand-17': blackjack.Strategy.thresholds(stand=17),
+    'never-double': blackjack.Strategy.thresholds(double_low=22),
+}
+
+
+def simulate_cases(games):
+    for decks in (1, 2, 6, 8):
+        yield f"simulate decks={decks}", lambda decks=decks: blackjack.run_batch(games, 0, decks=decks), games
+    for players in (3, 7):
+        yield f"simulate players={players}", lambda players=players: blackjack.run_batch(
+            games, 0, players=players), games * players
+    for name, strategy in STRATEGIES.items():
+        yield f"simulate strategy={name}", lambda strategy=strategy: blackjack.run_batch(
+            games, 0, strategy=strategy), games
+    if blackjack.np is not None:
+        yield "simulate bulk shoes", lambda: blackjack.run_batch(games, 0, bulk=True), games
+
+
+def batch_cases(games):
+    if blackjack.np is None:
+        return
+    for decks in (1, 8):
+        yield f"simulate_batch decks={decks}", lambda decks=decks: blackjack.simulate_batch(
+            games, decks=decks, seed=0), games
+    yield "simulate_batch players=7", lambda: blackjack.simulate_batch(games, players=7, seed=0), games * 7
+
+
+def sharded_cases(games):
+    yield "run_sharded", lambda: blackjack.run_sharded(games, batches=16, seed=0), games
+
+
+def run(repeat=3, scale=1):
+    """Time every case, keeping the best of repeat runs, in hands per second.
+    """
+    cases = [
+        *simulate_cases(20_000 * scale),
+        *batch_cases(500_000 * scale),
+        *sharded_cases(200_000 * scale),
+    ]
+    results = {}
+    for name, case, hands in cases:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case()
+            best = min(best, time.perf_counter() - start)
+        results[name] = hands / best
+        print(f"{name:<32} {results[name]:>14,.0f} hands/s")
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Print the change against baseline, returning the cases that slowed
+    down by more than tolerance.
+    """
+    slower = []
+    for name, rate in results.items():
+        if name not in baseline:
+            print(f"{name:<32} {'new':>14}")
+            continue
+        change = rate / baseline[name] - 1
+        flag = ''
+        if change < -tolerance:
+            slower.append(name)
+            flag = '  SLOWER'
+        print(f"{name:<32} {change:>+13.1%}{flag}")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="slowdown to flag, as a fraction")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=int, default=1, help="multiply the games played per case")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.scale)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print()
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Blackjack strategy search
+
+Tunes the Strategy.thresholds parameters by playing every candidate over
+the same pre-shuffled shoes (common random numbers), so differences
+between candidates are measured on identical cards and need far fewer
+games to tell apart. Blocks of shoes are played across worker processes
+and candidates that are clearly worse than the leader are dropped after
+every round.
+
+    python blackjack_optimize.py --rounds 20 --block 20000
+"""
+import argparse
+import concurrent.futures
+import itertools
+import json
+import random
+import statistics
+from functools import partial
+
+import numpy as np
+
+import blackjack
+
+GRID = {
+    'stand': (15, 16, 17),
+    'margin': (6, 7, 8, 9),
+    'double_low': (9, 10),
+    'double_high': (10, 11),
+    'split_margin': (7, 8, 9),
+}
+
+
+def candidates(grid=GRID):
+    keys = tuple(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+
+def play_block(seed, params, games, decks=8, players=1):
+    """Play every candidate over the same block of shoes.
+
+    Returns (pot, invested) for each candidate.
+    """
+    rng = np.random.default_rng(seed)
+    cards = np.array(blackjack.get_cards(decks), dtype=np.int8)
+    shoes = rng.permuted(np.broadcast_to(cards, (games, len(cards))), axis=1)
+    out = []
+    for p in params:
+        results = blackjack.play_shoes(shoes, players, strategy=blackjack.Strategy.thresholds(**p))
+        out.append((results['pot'], results['invested']))
+    return out
+
+
+def interval(samples, z=1.96):
+    """Mean of samples and the half-width of its confidence interval."""
+    if len(samples) < 2:
+        return statistics.mean(samples), float('inf')
+    return statistics.mean(samples), z * statistics.stdev(samples) / len(samples) ** 0.5
+
+
+def optimize(grid=GRID, rounds=20, blocks=8, block=20_000, seed=0, workers=None, decks=8, players=1):
+    """Search grid for the strategy with the best return ratio.
+
+    Each round plays blocks more blocks of block games per surviving
+    candidate. Candidates whose paired difference from the leader is
+    below zero with 95% confidence are pruned. Returns the best parameters
+    with the mean and half-width of their per block ratio, and how many
+    candidates were left.
+    """
+    alive = candidates(grid)
+    samples = [[] for _ in alive]
+    master = random.Random(seed)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for round_ in range(rounds):
+            seeds = [master.getrandbits(64) for _ in range(blocks)]
+            play = partial(play_block, params=alive, games=block, decks=decks, players=players)
+            for block_results in pool.map(play, seeds):
+                for ratios, (pot, invested) in zip(samples, block_results):
+                    ratios.append(pot / invested)
+
+            best = max(range(len(alive)), key=lambda i: statistics.mean(samples[i]))
+            keep = []
+            for i, ratios in enumerate(samples):
+                diff, half_width = interval([a - b for a, b in zip(ratios, samples[best])])
+                if i == best or diff + half_width >= 0:
+                    keep.append(i)
+            alive = [alive[i] for i in keep]
+            samples = [samples[i] for i in keep]
+            best = keep.index(best)
+            mean, half_width = interval(samples[best])
+            print(f"round {round_ + 1}: {len(alive)} left, best {alive[best]} {mean:.4f} ± {half_width:.4f}")
+            if len(alive) == 1:
+                break
+
+    mean, half_width = interval(samples[best])
+    return alive[best], mean, half_width, len(alive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--blocks', type=int, default=8, help="blocks of shoes per round")
+    parser.add_argument('--block', type=int, default=20_000, help="games per block")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--save', metavar='PATH', help="save the best strategy as JSON")
+    args = parser.parse_args()
+
+    params, mean, half_width, left = optimize(
+        rounds=args.rounds, blocks=args.blocks, block=args.block, seed=args.seed, workers=args.workers)
+    print(f"Best: {params}")
+    print(f"Ratio: {mean:.4f} ± {half_width:.4f} (95% CI, {left} candidates not ruled out)")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'thresholds': params}, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Blackjack parameter sweep
+
+Plays every combination of the given decks, players, bets and shoe
+penetrations, in parallel, and prints a table. Each cell is cached on disk
+under its parameters and seed, so growing a sweep by one value only plays
+the new cells.
+
+    python blackjack_sweep.py --decks 1,2,6,8 --players 1,3 --penetration 0.5,0.75
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+
+import blackjack
+
+CACHE = '.blackjack_sweep'
+
+
+def cell_key(cell, strategy):
+    data = json.dumps([cell, strategy.hit, strategy.double, strategy.split], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()[:24]
+
+
+def run_cell(cell, strategy):
+    results = blackjack.run_batch(
+        cell['games'], cell['seed'], decks=cell['decks'], players=cell['players'],
+        bet_per_game=cell['bet_per_game'], penetration=cell['penetration'], strategy=strategy)
+    return results.as_dict()
+
+
+def sweep(grid, games, seed=0, strategy=blackjack.DEFAULT_STRATEGY, cache=CACHE, workers=None):
+    """Play every cell of grid, reusing cached cells.
+
+    grid maps run_batch keywords (decks, players, bet_per_game, penetration)
+    to the values to try. Returns (cell, results, cached) for every cell.
+    """
+    os.makedirs(cache, exist_ok=True)
+    keys = tuple(grid)
+    cells = [dict(zip(keys, values), games=games, seed=seed) for values in itertools.product(*grid.values())]
+    paths = [os.path.join(cache, cell_key(cell, strategy) + '.json') for cell in cells]
+    found = {}
+    for path in paths:
+        if os.path.exists(path):
+            with open(path) as f:
+                found[path] = json.load(f)['results']
+
+    missing = [(cell, path) for cell, path in zip(cells, paths) if path not in found]
+    if missing:
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            jobs = [pool.submit(run_cell, cell, strategy) for cell, _ in missing]
+            for (cell, path), job in zip(missing, jobs):
+                results = job.result()
+                with open(path, 'w') as f:
+                    json.dump({'cell': cell, 'results': results}, f)
+
+    rows = []
+    for cell, path in zip(cells, paths):
+        cached = path in found
+        if not cached:
+            with open(path) as f:
+                found[path] = json.load(f)['results']
+        rows.append((cell, blackjack.Counters(**found[path]), cached))
+    return rows
+
+
+def print_table(rows):
+    print(f"{'decks':>5} {'players':>7} {'bet':>5} {'pen':>5} {'games':>9} {'ratio':>7} "
+          f"{'win':>6} {'push':>6} {'lose':>6} {'bust':>6}")
+    for cell, results, cached in rows:
+        hands = cell['games'] * cell['players']
+        print(f"{cell['decks']:>5} {cell['players']:>7} {cell['bet_per_game']:>5} {cell['penetration']:>5} "
+              f"{cell['games']:>9} {blackjack.ratio(results):>7.4f} "
+              f"{results.win / hands:>6.3f} {results.push / hands:>6.3f} "
+              f"{results.lose / hands:>6.3f} {results.bust / hands:>6.3f}  {'cached' if cached else ''}")
+
+
+def values(kind):
+    return lambda text: tuple(kind(x) for x in text.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--decks', type=values(int), default=(8,))
+    parser.add_argument('--players', type=values(int), default=(1,))
+    parser.add_argument('--bet', type=values(int), default=(1,))
+    parser.add_argument('--penetration', type=values(float), default=(0.75,))
+    parser.add_argument('--games', type=int, default=170_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--strategy', metavar='PATH', help="strategy JSON to play")
+    parser.add_argument('--cache', default=CACHE)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    strategy = blackjack.Strategy.load(args.strategy) if args.strategy else blackjack.DEFAULT_STRATEGY
+    grid = {'decks': args.decks, 'players': args.players, 'bet_per_game': args.bet,
+            'penetration': args.penetration}
+    print_table(sweep(grid, args.games, args.seed, strategy, args.cache, args.workers))
+
+
+if __name__ == '__main__':
+    main()
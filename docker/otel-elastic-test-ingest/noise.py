@@ -1,13 +1,156 @@
-from opentelemetry import trace
-from opentelemetry.metrics import get_meter
+"""OTLP load generator
 
+Sends traces of nested spans and counter increments at a fixed rate from
+several processes, through the SDK's batch span processor and periodic
+metric reader, to find how much a collector pipeline can ingest. Reports
+the achieved rate, per batch export latency percentiles and dropped spans.
 
-with trace.get_tracer("my.tracer").start_as_current_span("foo"):
-    with trace.get_tracer("my.tracer").start_as_current_span("bar"):
-        print("baz")
+    python noise.py --rate 20000 --processes 4 --depth 3 --cardinality 100
+"""
+import argparse
+import concurrent.futures
+import statistics
+import time
 
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
 
-meter = get_meter("example-meter")
-counter = meter.create_counter("example-counter")
 
-counter.add(1, {"my-key": "my-value"})
+def exporters(protocol):
+    if protocol == 'grpc':
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    else:
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    return OTLPSpanExporter, OTLPMetricExporter
+
+
+def timed(exporter, size, stats):
+    """Subclass exporter to time every export call into stats."""
+    class Timed(exporter):
+        def export(self, batch, *args, **kwargs):
+            start = time.perf_counter()
+            result = super().export(batch, *args, **kwargs)
+            stats['latency'].append(time.perf_counter() - start)
+            stats['batches'] += 1
+            stats['exported' if result.name == 'SUCCESS' else 'failed'] += size(batch)
+            return result
+    return Timed
+
+
+def data_points(metrics_data):
+    return sum(len(metric.data.data_points)
+               for resource in metrics_data.resource_metrics
+               for scope in resource.scope_metrics
+               for metric in scope.metrics)
+
+
+def generate(worker, args):
+    """Send args.rate / args.processes spans per second for args.duration
+    seconds. Returns the span and metric export stats of this process.
+    """
+    spans = {'latency': [], 'batches': 0, 'exported': 0, 'failed': 0, 'sent': 0}
+    points = {'latency': [], 'batches': 0, 'exported': 0, 'failed': 0}
+    span_exporter, metric_exporter = exporters(args.protocol)
+    span_exporter = timed(span_exporter, len, spans)
+    metric_exporter = timed(metric_exporter, data_points, points)
+    traces_endpoint = metrics_endpoint = {}
+    if args.endpoint and args.protocol == 'grpc':
+        traces_endpoint = metrics_endpoint = {'endpoint': args.endpoint,
+                                               'insecure': not args.endpoint.startswith('https://')}
+    elif args.endpoint:
+        traces_endpoint = {'endpoint': args.endpoint.rstrip('/') + '/v1/traces'}
+        metrics_endpoint = {'endpoint': args.endpoint.rstrip('/') + '/v1/metrics'}
+
+    resource = Resource.create({'service.name': 'noise', 'service.instance.id': str(worker)})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(
+        span_exporter(**traces_endpoint), max_queue_size=args.max_queue, max_export_batch_size=args.batch_size,
+        schedule_delay_millis=args.delay, export_timeout_millis=args.export_timeout))
+    meter_provider = MeterProvider([PeriodicExportingMetricReader(
+        metric_exporter(**metrics_endpoint), export_interval_millis=args.metric_interval)], resource=resource)
+    tracer = tracer_provider.get_tracer("my.tracer")
+    counter = meter_provider.get_meter("example-meter").create_counter("example-counter")
+
+    attributes = {f"attr.{i}": "x" * args.attribute_size for i in range(args.attributes)}
+    series = [{"my-key": f"value-{i}", "worker": worker} for i in range(args.cardinality)]
+    interval = args.depth * args.processes / args.rate
+    start = time.perf_counter()
+    traces = 0
+    while True:
+        wait = start + traces * interval - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        if time.perf_counter() - start >= args.duration:
+            break
+        nest(tracer, args.depth, attributes)
+        counter.add(1, series[traces % args.cardinality])
+        traces += 1
+    spans['sent'] = traces * args.depth
+    spans['elapsed'] = time.perf_counter() - start
+
+    tracer_provider.shutdown()
+    meter_provider.shutdown()
+    return spans, points
+
+
+def nest(tracer, depth, attributes):
+    with tracer.start_as_current_span(f"span-{depth}", attributes=attributes):
+        if depth > 1:
+            nest(tracer, depth - 1, attributes)
+
+
+def percentiles(latency):
+    if len(latency) < 2:
+        return ' '.join(f"{name} {latency[0] * 1000 if latency else 0:.1f}ms" for name in ('p50', 'p90', 'p99'))
+    cuts = statistics.quantiles(latency, n=100, method='inclusive')
+    return f"p50 {cuts[49] * 1000:.1f}ms p90 {cuts[89] * 1000:.1f}ms p99 {cuts[98] * 1000:.1f}ms " \
+           f"max {max(latency) * 1000:.1f}ms"
+
+
+def report(results, args):
+    spans = {key: sum(r[0][key] for r in results) for key in ('batches', 'exported', 'failed', 'sent')}
+    points = {key: sum(r[1][key] for r in results) for key in ('batches', 'exported', 'failed')}
+    elapsed = max(r[0]['elapsed'] for r in results)
+    dropped = spans['sent'] - spans['exported'] - spans['failed']
+    print(f"  Target: {args.rate:,.0f} spans/s over {args.processes} processes")
+    print(f"    Sent: {spans['sent']:,} spans, {spans['sent'] / elapsed:,.0f} spans/s")
+    print(f"Exported: {spans['exported']:,} spans, {spans['exported'] / elapsed:,.0f} spans/s "
+          f"in {spans['batches']:,} batches")
+    print(f"  Failed: {spans['failed']:,} spans")
+    print(f" Dropped: {dropped:,} spans ({dropped / (spans['sent'] or 1):.2%})")
+    print(f" Latency: {percentiles([x for r in results for x in r[0]['latency']])}")
+    print(f" Metrics: {points['exported']:,} points in {points['batches']:,} batches, "
+          f"{points['failed']:,} failed, {percentiles([x for r in results for x in r[1]['latency']])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=1000, help="spans per second, over all processes")
+    parser.add_argument('--duration', type=float, default=10, help="seconds")
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--depth', type=int, default=2, help="spans per trace, each nested in the last")
+    parser.add_argument('--attributes', type=int, default=1, help="attributes per span")
+    parser.add_argument('--attribute-size', type=int, default=16, help="bytes per attribute value")
+    parser.add_argument('--cardinality', type=int, default=1, help="counter attribute sets per process")
+    parser.add_argument('--protocol', choices=('grpc', 'http'), default='grpc')
+    parser.add_argument('--endpoint', help="host:port for grpc (plaintext unless https://), base URL for http; "
+                        "defaults to OTEL_EXPORTER_OTLP_ENDPOINT or localhost")
+    parser.add_argument('--max-queue', type=int, default=2048)
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--delay', type=int, default=5000, help="batch span processor schedule delay, ms")
+    parser.add_argument('--export-timeout', type=int, default=30000, help="ms")
+    parser.add_argument('--metric-interval', type=int, default=1000, help="ms")
+    args = parser.parse_args()
+
+    with concurrent.futures.ProcessPoolExecutor(args.processes) as pool:
+        results = list(pool.map(generate, range(args.processes), [args] * args.processes))
+    report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Local OTLP sink
+
+Stands in for the collector and Elasticsearch: accepts OTLP traces and
+metrics over gRPC and HTTP, appends each request to a log file and prints
+the receive rate and per batch latency, so exporter settings can be
+benchmarked offline.
+
+    python sink.py --log otlp.log
+    python noise.py --endpoint http://localhost:4317 --rate 20000
+    python sink.py --dump otlp.log
+
+Each log record is a header of signal, receive time in ns and payload
+length, followed by the request exactly as its protobuf was received.
+"""
+import argparse
+import concurrent.futures
+import gzip
+import http.server
+import statistics
+import struct
+import threading
+import time
+
+import grpc
+from opentelemetry.proto.collector.metrics.v1.metrics_service_pb2 import ExportMetricsServiceRequest
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import ExportTraceServiceRequest
+
+HEADER = struct.Struct('<BQI')
+SIGNALS = ('traces', 'metrics')
+
+
+def spans(request):
+    return sum(len(scope.spans) for resource in request.resource_spans for scope in resource.scope_spans)
+
+
+def data_points(request):
+    return sum(len(getattr(metric, metric.WhichOneof('data')).data_points)
+               for resource in request.resource_metrics
+               for scope in resource.scope_metrics
+               for metric in scope.metrics
+               if metric.WhichOneof('data'))
+
+
+PARSERS = {
+    'traces': (ExportTraceServiceRequest, spans),
+    'metrics': (ExportMetricsServiceRequest, data_points),
+}
+
+
+class Sink:
+    """Appends requests to a log and keeps receive stats per signal."""
+
+    def __init__(self, path, count=True):
+        self.log = open(path, 'ab')
+        self.count = count
+        self.lock = threading.Lock()
+        self.start = self.last = time.perf_counter()
+        self.totals = {signal: [0, 0, 0] for signal in SIGNALS}
+        self.window = {signal: [0, 0, 0, []] for signal in SIGNALS}
+
+    def receive(self, signal, payload):
+        """Store one request, returning how many items it held."""
+        start = time.perf_counter()
+        items = 0
+        if self.count:
+            kind, size = PARSERS[signal]
+            items = size(kind.FromString(payload))
+        with self.lock:
+            self.log.write(HEADER.pack(SIGNALS.index(signal), time.time_ns(), len(payload)))
+            self.log.write(payload)
+            latency = time.perf_counter() - start
+            for stats in (self.totals[signal], self.window[signal]):
+                stats[0] += 1
+                stats[1] += items
+                stats[2] += len(payload)
+            self.window[signal][3].append(latency)
+        return items
+
+    def report(self):
+        with self.lock:
+            window, self.window = self.window, {signal: [0, 0, 0, []] for signal in SIGNALS}
+            self.log.flush()
+        now = time.perf_counter()
+        elapsed, self.last = now - self.last, now
+        for signal in SIGNALS:
+            requests, items, size, latency = window[signal]
+            if not requests:
+                continue
+            print(f"{signal:>7}: {items / elapsed:>10,.0f} items/s {requests / elapsed:>8,.1f} batches/s "
+                  f"{size / elapsed / 1e6:>7.2f} MB/s  latency {percentiles(latency)}", flush=True)
+
+    def close(self):
+        total = time.perf_counter() - self.start
+        for signal in SIGNALS:
+            requests, items, size = self.totals[signal]
+            print(f"{signal:>7}: {items:,} items in {requests:,} batches, {size / 1e6:.1f} MB, "
+                  f"{items / total:,.0f} items/s")
+        self.log.close()
+
+
+def percentiles(latency):
+    cuts = statistics.quantiles(latency, n=100, method='inclusive') if len(latency) > 1 else latency * 99
+    return f"p50 {cuts[49] * 1000:.2f}ms p99 {cuts[98] * 1000:.2f}ms max {max(latency) * 1000:.2f}ms"
+
+
+def grpc_server(sink, address, workers=8):
+    """Serve the OTLP gRPC services, keeping requests as raw bytes."""
+    def handler(signal):
+        def export(payload, context):
+            sink.receive(signal, payload)
+            return b''  # an empty Export*ServiceResponse
+        return grpc.unary_unary_rpc_method_handler(export)
+
+    server = grpc.server(concurrent.futures.ThreadPoolExecutor(workers))
+    server.add_generic_rpc_handlers([
+        grpc.method_handlers_generic_handler('opentelemetry.proto.collector.trace.v1.TraceService',
+                                             {'Export': handler('traces')}),
+        grpc.method_handlers_generic_handler('opentelemetry.proto.collector.metrics.v1.MetricsService',
+                                             {'Export': handler('metrics')}),
+    ])
+    server.add_insecure_port(address)
+    server.start()
+    return server
+
+
+def http_server(sink, address):
+    """Serve OTLP/HTTP protobuf on /v1/traces and /v1/metrics."""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            signal = self.path.rstrip('/').rsplit('/', 1)[-1]
+            if signal not in SIGNALS:
+                self.send_error(404)
+                return
+            payload = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                payload = gzip.decompress(payload)
+            sink.receive(signal, payload)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-protobuf')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    host, port = address.rsplit(':', 1)
+    server = http.server.ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def records(path):
+    """Yield (signal, time_ns, payload) for every request in a log."""
+    with open(path, 'rb') as f:
+        while header := f.read(HEADER.size):
+            signal, time_ns, length = HEADER.unpack(header)
+            yield SIGNALS[signal], time_ns, f.read(length)
+
+
+def dump(path):
+    totals = {signal: [0, 0, 0] for signal in SIGNALS}
+    first = last = None
+    for signal, time_ns, payload in records(path):
+        kind, size = PARSERS[signal]
+        stats = totals[signal]
+        stats[0] += 1
+        stats[1] += size(kind.FromString(payload))
+        stats[2] += len(payload)
+        first = first or time_ns
+        last = time_ns
+    for signal in SIGNALS:
+        requests, items, size = totals[signal]
+        print(f"{signal:>7}: {items:,} items in {requests:,} batches, {size / 1e6:.1f} MB")
+    if first is not None:
+        print(f"   span: {(last - first) / 1e9:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log', default='otlp.log', help="file to append requests to")
+    parser.add_argument('--grpc', default='0.0.0.0:4317', help="gRPC address, empty to disable")
+    parser.add_argument('--http', default='0.0.0.0:4318', help="HTTP address, empty to disable")
+    parser.add_argument('--workers', type=int, default=8, help="gRPC handler threads")
+    parser.add_argument('--report', type=float, default=5, help="seconds between reports")
+    parser.add_argument('--no-count', action='store_true', help="log without parsing to count items")
+    parser.add_argument('--dump', metavar='LOG', help="summarise a log instead of receiving")
+    args = parser.parse_args()
+
+    if args.dump:
+        dump(args.dump)
+        return
+    sink = Sink(args.log, count=not args.no_count)
+    servers = []
+    if args.grpc:
+        servers.append(grpc_server(sink, args.grpc, args.workers))
+    if args.http:
+        servers.append(http_server(sink, args.http))
+    print(f"Receiving on {' and '.join(filter(None, (args.grpc, args.http)))}, logging to {args.log}", flush=True)
+    try:
+        while True:
+            time.sleep(args.report)
+            sink.report()
+    except KeyboardInterrupt:
+        pass
+    for server in servers:
+        if isinstance(server, http.server.ThreadingHTTPServer):
+            server.shutdown()
+        else:
+            server.stop(1).wait()
+    sink.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""FABRIK solver benchmarks
+
+Times the solver without a window, in solves per second, and counts the
+iterations each solve needs to get within tolerance, over chain lengths
+and goal distances (as a fraction of the chain's reach). With --trees it
+times multi-effector hand and spine skeletons instead, and with --solver
+it drags a FabrikSolver's goal around, with and without a time budget,
+and prints its solve stats.
+
+    python fabrik_bench.py --joints 5,20,100 --distance 0.25,0.75,0.99
+    python fabrik_bench.py --trees
+    python fabrik_bench.py --solver --joints 100 --distance 0.9 --budget 0.0005
+"""
+import argparse
+import time
+
+import numpy as np
+
+import fabrik_solver
+
+
+def curled_chain(joints, length=10.0, bend=0.3):
+    """A chain of equal edges turning by bend radians at every joint."""
+    angles = np.arange(joints - 1) * bend
+    verts = np.zeros((joints, 2))
+    verts[1:, 0] = np.cumsum(np.cos(angles)) * length
+    verts[1:, 1] = np.cumsum(np.sin(angles)) * length
+    return verts
+
+
+def goals(verts, lengths, distance, count, seed=0):
+    """Goals distance times the chain's reach from its start, in random
+    directions.
+    """
+    angles = np.random.default_rng(seed).uniform(0, 2 * np.pi, count)
+    reach = lengths.sum() * distance
+    return verts[0] + reach * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def bench_chain(joints, distance, tolerance, iterations, duration):
+    """Solve a chain from the same pose towards varying goals for about
+    duration seconds. Returns solves per second and the iterations used.
+    """
+    verts = curled_chain(joints)
+    lengths = fabrik_solver.get_edge_lengths(verts)
+    targets = goals(verts, lengths, distance, 256)
+    used = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for goal in targets:
+            pose = verts.copy()
+            used.append(fabrik_solver.solve_chain(pose, lengths, goal, tolerance, iterations))
+    return len(used) / (time.perf_counter() - start), np.array(used)
+
+
+def bench_batch(joints, distance, tolerance, iterations, chains=1000):
+    """Solve chains copies of a chain at once. Returns solves per second,
+    the iterations used and how many chains reached tolerance.
+    """
+    verts = curled_chain(joints)
+    lengths = fabrik_solver.get_edge_lengths(verts)
+    targets = goals(verts, lengths, distance, chains)
+    poses = np.broadcast_to(verts, (chains, joints, 2)).copy()
+    start = time.perf_counter()
+    used, error = fabrik_solver.solve_chains(poses, np.tile(lengths, (chains, 1)), targets, tolerance, iterations)
+    return chains / (time.perf_counter() - start), used, (error <= tolerance).sum()
+
+
+class Actor:
+    """Stands in for a game actor, which the solver only needs a location
+    of.
+    """
+
+    def __init__(self, location):
+        self.location = location
+
+
+def bench_solver(joints, distance, tolerance, iterations, time_budget, frames=2000):
+    """Drive a FabrikSolver like a dragged end effector, its goal circling
+    distance times the chain's reach from the start and resting one frame
+    in four. Returns the solver, whose stats hold the results.
+    """
+    verts = curled_chain(joints)
+    reach = fabrik_solver.get_edge_lengths(verts).sum() * distance
+    solver = fabrik_solver.FabrikSolver()
+    solver.tolerance = tolerance
+    solver.iterations = iterations
+    solver.time_budget = time_budget
+    solver.points = [Actor(fabrik_solver.Point(x, y)) for x, y in verts.tolist()]
+    solver.end_effector = Actor(None)
+    for frame in range(frames):
+        angle = 2 * np.pi * (frame - frame // 4) / 500
+        solver.end_effector.location = fabrik_solver.Point(
+            *(verts[0] + reach * np.array([np.cos(angle), np.sin(angle)])))
+        solver.solve()
+    return solver
+
+
+def branch(verts, parents, parent, joints, angle, length=10.0):
+    """Grow a straight branch of joints from parent, returning its tip."""
+    for _ in range(joints):
+        x, y = verts[parent]
+        verts.append((x + length * np.cos(angle), y + length * np.sin(angle)))
+        parents.append(parent)
+        parent = len(verts) - 1
+    return parent
+
+
+def hand(fingers=5, joints=4, palm=3):
+    """Wrist at the root, a palm chain, and fingers fanning out of it."""
+    verts, parents = [(0.0, 0.0)], [-1]
+    base = branch(verts, parents, 0, palm, np.pi / 2)
+    tips = [branch(verts, parents, base, joints, np.pi / 2 + (f - (fingers - 1) / 2) * 0.3, 6.0)
+            for f in range(fingers)]
+    return np.array(verts), parents, tips
+
+
+def spine(vertebrae=8, limb=4):
+    """Pelvis at the root with legs, a spine, arms and a head."""
+    verts, parents = [(0.0, 0.0)], [-1]
+    feet = [branch(verts, parents, 0, limb, angle) for angle in (-2.0, -1.1)]
+    neck = branch(verts, parents, 0, vertebrae, np.pi / 2, 5.0)
+    hands = [branch(verts, parents, neck, limb, angle) for angle in (0.3, np.pi - 0.3)]
+    head = branch(verts, parents, neck, 2, np.pi / 2, 4.0)
+    return np.array(verts), parents, feet + hands + [head]
+
+
+def chain_to(parents, joint):
+    path = []
+    while joint >= 0:
+        path.append(joint)
+        joint = parents[joint]
+    return path[::-1]
+
+
+def bent(verts, parents, rng, spread=0.4):
+    """The pose with every bone turned by a random angle, to get goals the
+    tree can reach exactly.
+    """
+    pose = verts.copy()
+    turn = np.zeros(len(verts))
+    for i in range(1, len(verts)):
+        parent = parents[i]
+        turn[i] = turn[parent] + rng.uniform(-spread, spread)
+        c, s = np.cos(turn[i]), np.sin(turn[i])
+        x, y = verts[i] - verts[parent]
+        pose[i] = pose[parent] + (c * x - s * y, s * x + c * y)
+    return pose
+
+
+def reattach(pose, parents, lengths):
+    """Put every joint back at its bone's length from its parent."""
+    for i in range(1, len(pose)):
+        offset = pose[i] - pose[parents[i]]
+        pose[i] = pose[parents[i]] + offset * (lengths[i] / np.hypot(*offset))
+
+
+def bench_tree(name, verts, parents, effectors, tolerance, iterations, duration, seed=0):
+    """Solve a tree towards reachable goals, against solving the path to
+    each effector as its own chain (then reattaching the branches that
+    moving the shared bones left behind).
+    """
+    tree = fabrik_solver.JointTree.from_verts(verts, parents)
+    rng = np.random.default_rng(seed)
+    targets = []
+    for _ in range(64):
+        pose = bent(verts, parents, rng)
+        targets.append({e: pose[e] for e in effectors})
+    paths = [chain_to(parents, e) for e in effectors]
+    path_lengths = [fabrik_solver.get_edge_lengths(verts[path]) for path in paths]
+
+    used, errors = [], []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for goals in targets:
+            pose = verts.copy()
+            used.append(tree.solve(pose, goals, tolerance, iterations))
+            errors.append(max(np.hypot(*(pose[e] - goal)) for e, goal in goals.items()))
+    tree_rate = len(used) / (time.perf_counter() - start)
+
+    chain_errors = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for goals in targets:
+            pose = verts.copy()
+            for path, lengths, effector in zip(paths, path_lengths, effectors):
+                points = pose[path]
+                fabrik_solver.solve_chain(points, lengths, goals[effector], tolerance, iterations)
+                pose[path] = points
+            reattach(pose, parents, tree.lengths)
+            chain_errors.append(max(np.hypot(*(pose[e] - goal)) for e, goal in goals.items()))
+    chain_rate = len(chain_errors) / (time.perf_counter() - start)
+    print(f"{name:>6} {len(verts):>6} {len(effectors):>9} {iterations:>5} {tree_rate:>10,.0f} "
+          f"{np.mean(used):>9.2f} {np.median(errors):>9.4f} {max(errors):>9.4f} "
+          f"{chain_rate:>10,.0f} {np.median(chain_errors):>9.4f}")
+
+
+def values(kind):
+    return lambda text: tuple(kind(x) for x in text.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--joints', type=values(int), default=(5, 20, 100, 500))
+    parser.add_argument('--distance', type=values(float), default=(0.25, 0.5, 0.9, 0.99))
+    parser.add_argument('--tolerance', type=float, default=0.01)
+    parser.add_argument('--iterations', type=int, default=100, help="cap on iterations per solve")
+    parser.add_argument('--duration', type=float, default=0.5, help="seconds per single chain case")
+    parser.add_argument('--chains', type=int, default=1000, help="chains per batch solve")
+    parser.add_argument('--trees', action='store_true', help="benchmark hand and spine trees instead")
+    parser.add_argument('--solver', action='store_true', help="report FabrikSolver's solve stats instead")
+    parser.add_argument('--budget', type=float, default=0.0005, help="seconds per solve for --solver's budgeted run")
+    args = parser.parse_args()
+
+    if args.solver:
+        for joints in args.joints:
+            for distance in args.distance:
+                for time_budget in (None, args.budget):
+                    budget = 'no budget' if time_budget is None else f'{time_budget * 1e6:.0f}us budget'
+                    print(f"{joints} joints, distance {distance}, {args.iterations} iterations, {budget}")
+                    bench_solver(joints, distance, args.tolerance, args.iterations, time_budget).stats.report()
+                    print()
+        return
+
+    if args.trees:
+        print(f"{'tree':>6} {'joints':>6} {'effectors':>9} {'cap':>5} {'solves/s':>10} {'iter mean':>9} "
+              f"{'mid error':>9} {'max error':>9} {'chains/s':>10} {'mid error':>9}")
+        # JointTree.solve's default cap as well as the one asked for.
+        for iterations in sorted({10, args.iterations}):
+            bench_tree('hand', *hand(), args.tolerance, iterations, args.duration)
+            bench_tree('spine', *spine(), args.tolerance, iterations, args.duration)
+        return
+
+    print(f"{'joints':>6} {'dist':>5} {'solves/s':>10} {'iter mean':>9} {'p90':>4} {'max':>4}  "
+          f"{'batch/s':>10} {'converged':>9}")
+    for joints in args.joints:
+        for distance in args.distance:
+            rate, used = bench_chain(joints, distance, args.tolerance, args.iterations, args.duration)
+            batch_rate, _, converged = bench_batch(joints, distance, args.tolerance, args.iterations, args.chains)
+            print(f"{joints:>6} {distance:>5} {rate:>10,.0f} {used.mean():>9.2f} "
+                  f"{np.percentile(used, 90):>4.0f} {used.max():>4}  {batch_rate:>10,.0f} "
+                  f"{converged / args.chains:>9.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('opentelemetry.sdk')
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+import blackjack
+
+
+def test_run_sharded_telemetry():
+    reader = InMemoryMetricReader()
+    spans = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(spans))
+    telemetry = blackjack.Telemetry(MeterProvider([reader]), tracer_provider)
+
+    results, ratio_samples = blackjack.run_sharded(2000, batches=4, workers=2, telemetry=telemetry)
+
+    metrics = {metric.name: metric.data.data_points
+               for resource in reader.get_metrics_data().resource_metrics
+               for scope in resource.scope_metrics
+               for metric in scope.metrics}
+    assert {'blackjack.games', 'blackjack.hands', 'blackjack.batch.rate', 'blackjack.batch.ratio',
+            'blackjack.worker.utilisation'} <= set(metrics)
+    assert metrics['blackjack.games'][0].value == 2000
+    assert metrics['blackjack.batch.ratio'][0].count == 4
+
+    finished = spans.get_finished_spans()
+    run, = [span for span in finished if span.name == 'blackjack.run_sharded']
+    batches = [span for span in finished if span.name == 'blackjack.batch']
+    assert len(batches) == 4
+    for span in batches:
+        assert span.parent.span_id == run.context.span_id
+        assert run.start_time <= span.end_time <= run.end_time